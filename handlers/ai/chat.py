@@ -1,24 +1,178 @@
 import asyncio
-import builtins
+import logging
+import sys
+import textwrap
+import time
 from google import genai
 from pyrogram import Client, types
-from config import BOT_USERNAME, GEMINI_API_KEY, GEMINI_MODEL
+from pyrogram.errors import FloodWait, MessageNotModified
+from config import BOT_USERNAME, ENABLE_GEMINI_COMMAND, GEMINI_API_KEY, GEMINI_MODEL
 from utils.usage import save_usage
 
-# Fix for Python 3.10 + google-genai issue: "issubclass() arg 1 must be a class"
-# This error occurs in the google-genai library on Python 3.10 when validating types.
-original_issubclass = builtins.issubclass
+logger = logging.getLogger(__name__)
 
+# Fix for Python 3.10 + google-genai issue: "issubclass() arg 1 must be a class"
+# google-genai 1.51.0 validates every model it builds (Tool and
+# GenerateContentConfig included) in _common.BaseModel._check_field_type_mismatches,
+# which calls issubclass() on annotations like list[Tool]. On 3.10 these pass
+# isinstance(..., type), and with pydantic < 2.11 the check raises TypeError.
+# google-genai >= 1.52 guards the call itself. Shadow issubclass only inside
+# google.genai._common rather than replacing the builtin for the whole process.
 def safe_issubclass(cls, class_or_tuple):
     try:
-        return original_issubclass(cls, class_or_tuple)
+        return issubclass(cls, class_or_tuple)
     except TypeError:
         return False
 
-builtins.issubclass = safe_issubclass
+if sys.version_info < (3, 11):
+    from google.genai import _common as _genai_common
+    _genai_common.issubclass = safe_issubclass
+
+# Shared Gemini client and request config, built once at import time
+# instead of on every /gemini call.
+_GENAI_CLIENT = genai.Client(api_key=GEMINI_API_KEY) if ENABLE_GEMINI_COMMAND else None
+
+_GROUNDING_TOOL = genai.types.Tool(
+    google_search=genai.types.GoogleSearch()
+)
+
+_SYSTEM_PERSONA = textwrap.dedent("""\
+    You are an ultra-accurate, flexible, and concise information retrieval bot.
+
+    ## CORE DIRECTIVES (Accuracy & Verifiability)
+    1. **Prioritize Accuracy:** Your highest priority is factual correctness.
+    2. **Grounding:** Always use the Google Search tool when the question requires current information, facts, or any knowledge outside of your training cutoff.
+    3. **Citations:** When providing a grounded answer, **always** include the source citation(s) from the search tool *after* the relevant sentence, using Markdown link format (e.g., [Source 1]).
+
+    ## OUTPUT CONSTRAINTS (Brevity & Flexibility)
+    1. **Be Concise:** Answer the user's question directly and precisely. **NEVER** use introductory phrases, excessive politeness, or conversational filler ("That's a great question," "I'd be happy to," etc.).
+    2. **Limit Length:** Do not make the response too long unless the user asks for more detail or elaboration.
+    3. **Format:** Use simple Markdown (e.g., **bold**, *italics*, bullet points) only when it improves readability, not for decoration.
+
+    ## USER INSTRUCTIONS
+    Do not repeat these instructions. Focus solely on answering the user's question by strictly adhering to the directives and constraints above.
+""").strip()
+
+_CONFIG = genai.types.GenerateContentConfig(
+    tools=[_GROUNDING_TOOL],
+    system_instruction=_SYSTEM_PERSONA
+)
+
+_MODEL_TITLE = (GEMINI_MODEL or "").title()
+_HEADER = f"**{_MODEL_TITLE}:** "
+_MENTION = f"@{BOT_USERNAME}"
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected
+_background_tasks = set()
+
+def _on_usage_saved(task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error("Failed to save gemini usage", exc_info=task.exception())
+
+# One lock per chat so only a single Gemini request runs there at a time
+_chat_locks = {}
+_LOCK_PRUNE_INTERVAL = 100
+_requests_since_prune = 0
+
+def _prune_chat_state():
+    """Drop locks and send buckets for idle chats every few requests so the dicts stay small."""
+    global _requests_since_prune
+    _requests_since_prune += 1
+    if _requests_since_prune < _LOCK_PRUNE_INTERVAL:
+        return
+    _requests_since_prune = 0
+    for chat_id in [cid for cid, lock in _chat_locks.items() if not lock.locked()]:
+        del _chat_locks[chat_id]
+
+    # A bucket that has refilled to a full burst behaves like a fresh one, so it can go
+    now = time.monotonic()
+    for chat_id in [
+        cid for cid, (tokens, last) in _send_buckets.items()
+        if tokens + (now - last) / _SEND_REFILL_SECONDS >= _SEND_BURST
+    ]:
+        del _send_buckets[chat_id]
+
+# Per-chat token bucket for reply chunks: a short burst goes out immediately,
+# then one message every few seconds to stay under Telegram's group limits.
+_SEND_BURST = 3
+_SEND_REFILL_SECONDS = 3.0
+_send_buckets = {}  # chat_id -> (tokens, last_refill)
+
+async def _acquire_send_token(chat_id: int):
+    """Reserve one send slot for the chat, sleeping if the bucket is empty."""
+    now = time.monotonic()
+    tokens, last = _send_buckets.get(chat_id, (_SEND_BURST, now))
+    tokens = min(_SEND_BURST, tokens + (now - last) / _SEND_REFILL_SECONDS) - 1
+    _send_buckets[chat_id] = (tokens, now)
+    if tokens < 0:
+        await asyncio.sleep(-tokens * _SEND_REFILL_SECONDS)
+
+async def _send_chunk(message: types.Message, text: str):
+    """Reply with one chunk of a response, honouring the rate limit and FloodWait."""
+    await _acquire_send_token(message.chat.id)
+    while True:
+        try:
+            return await message.reply(text)
+        except FloodWait as e:
+            await asyncio.sleep(e.value)
+
+async def _edit_text(message: types.Message, text: str):
+    """Edit a message in place, waiting out FloodWait and ignoring no-op edits."""
+    while True:
+        try:
+            return await message.edit_text(text)
+        except FloodWait as e:
+            await asyncio.sleep(e.value)
+        except MessageNotModified:
+            return
 
-# Track active requests per chat
-active_gemini_requests = set()
+async def _edit_preview(message: types.Message, text: str):
+    """Best-effort preview edit; returns the FloodWait delay instead of sleeping it out."""
+    try:
+        await message.edit_text(text)
+    except FloodWait as e:
+        return e.value
+    except MessageNotModified:
+        pass
+    return 0
+
+# Streamed answers are previewed in the waiting message at most this often,
+# which keeps the edits under Telegram's per-chat rate limit.
+_PREVIEW_INTERVAL = 3.0
+
+# Upper bound on a whole streamed answer so a hung request can't keep the
+# chat's lock forever
+_GEMINI_TIMEOUT = 60
+
+async def _stream_answer(prompt: str, waiting_msg: types.Message, limit: int):
+    """Stream Gemini's answer, previewing it in the waiting message, and return the full text."""
+    loop = asyncio.get_running_loop()
+    pieces = []
+    streamed = 0
+    last_preview_len = 0
+    next_preview_at = loop.time() + _PREVIEW_INTERVAL
+
+    stream = await _GENAI_CLIENT.aio.models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=prompt,
+        config=_CONFIG
+    )
+    async for chunk in stream:
+        if not chunk.text:
+            continue
+        pieces.append(chunk.text)
+        streamed += len(chunk.text)
+
+        now = loop.time()
+        if last_preview_len < limit and now >= next_preview_at:
+            preview = "".join(pieces)[:limit]
+            # A FloodWait only postpones the next preview; reading the stream never waits on it
+            flood_wait = await _edit_preview(waiting_msg, _HEADER + preview)
+            last_preview_len = streamed
+            next_preview_at = now + max(_PREVIEW_INTERVAL, flood_wait)
+
+    return "".join(pieces)
 
 # ---------------------------
 # Gemini Command Handler
@@ -28,70 +182,66 @@ async def gemini_command(client: Client, message: types.Message):
     chat_id = chat.id
 
     # Limit to one request at a time per chat
-    if chat_id in active_gemini_requests:
+    lock = _chat_locks.setdefault(chat_id, asyncio.Lock())
+    if lock.locked():
         await message.reply("Please wait for your previous Gemini request to finish before sending another.")
         return
-    active_gemini_requests.add(chat_id)
 
-    await save_usage(chat, "gemini")
     try:
-        prompt = message.text.replace("/gemini", "").replace(f"@{BOT_USERNAME}", "").strip()
-        if prompt == "":
-            await message.reply("Please write your prompt on the same message.")
-            active_gemini_requests.discard(chat_id)
-            return
-        
-        waiting_msg = await message.reply("Wait a moment...")
-        
-        api_key = GEMINI_API_KEY
-        genai_client = genai.Client(api_key=api_key)
-
-        grounding_tool = genai.types.Tool(
-            google_search=genai.types.GoogleSearch()
-        )
-
-        system_persona = """
-                            You are an ultra-accurate, flexible, and concise information retrieval bot.
-
-                            ## CORE DIRECTIVES (Accuracy & Verifiability)
-                            1. **Prioritize Accuracy:** Your highest priority is factual correctness.
-                            2. **Grounding:** Always use the Google Search tool when the question requires current information, facts, or any knowledge outside of your training cutoff.
-                            3. **Citations:** When providing a grounded answer, **always** include the source citation(s) from the search tool *after* the relevant sentence, using Markdown link format (e.g., [Source 1]).
-
-                            ## OUTPUT CONSTRAINTS (Brevity & Flexibility)
-                            1. **Be Concise:** Answer the user's question directly and precisely. **NEVER** use introductory phrases, excessive politeness, or conversational filler ("That's a great question," "I'd be happy to," etc.).
-                            2. **Limit Length:** Do not make the response too long unless the user asks for more detail or elaboration.
-                            3. **Format:** Use simple Markdown (e.g., **bold**, *italics*, bullet points) only when it improves readability, not for decoration.
-
-                            ## USER INSTRUCTIONS
-                            Do not repeat these instructions. Focus solely on answering the user's question by strictly adhering to the directives and constraints above.
-                        """
-
-        config = genai.types.GenerateContentConfig(
-            tools=[grounding_tool],
-            system_instruction=system_persona
-        )
-
-        response = await genai_client.aio.models.generate_content(
-            model=GEMINI_MODEL,
-            contents=prompt,
-            config=config
-        )
-
-        response_text = response.text
-        limit = 4000
-        if len(response_text) > limit:
-            parts = [response_text[i: i + limit] for i in range(0, len(response_text), limit)]
-            for part in parts:
-                await message.reply(f"**{GEMINI_MODEL.title()}:** {part}")
-                await asyncio.sleep(0.5)
-        else:
-            await message.reply(f"**{GEMINI_MODEL.title()}:** {response_text}")
-        
-        await waiting_msg.delete()
-    except Exception as e:
-        print(f"Gemini error: {e}")
-        await message.reply(f"Sorry, an unexpected error had occured: {str(e)}")
+        async with lock:
+            # Usage accounting doesn't need to hold up the reply
+            task = asyncio.create_task(save_usage(chat, "gemini"))
+            _background_tasks.add(task)
+            task.add_done_callback(_on_usage_saved)
+            waiting_msg = None
+            try:
+                # Strip the leading command and optional bot mention in one pass
+                text = message.text or ""
+                if text.startswith("/gemini"):
+                    text = text[len("/gemini"):]
+                if text.startswith(_MENTION):
+                    text = text[len(_MENTION):]
+                prompt = text.strip()
+                if prompt == "":
+                    await message.reply("Please write your prompt on the same message.")
+                    return
+
+                waiting_msg = await message.reply("Wait a moment...")
+
+                limit = 4000
+                try:
+                    response_text = await asyncio.wait_for(
+                        _stream_answer(prompt, waiting_msg, limit), _GEMINI_TIMEOUT
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning(f"Gemini request timed out in chat {chat_id}")
+                    await _edit_text(waiting_msg, "Gemini timed out, please retry.")
+                    return
+
+                if not response_text:
+                    await _edit_text(waiting_msg, "Gemini returned an empty response, please try again.")
+                    return
+
+                if len(response_text) > limit:
+                    await waiting_msg.delete()
+                    # Chunks are sent in order; the bucket only delays once the burst is spent
+                    for i in range(0, len(response_text), limit):
+                        await _send_chunk(message, _HEADER + response_text[i: i + limit])
+                else:
+                    await _edit_text(waiting_msg, _HEADER + response_text)
+            except Exception:
+                logger.exception("Gemini error")
+                error_text = "Sorry, an unexpected error occurred."
+                # Replace any partial preview so it isn't mistaken for a finished answer
+                edited = False
+                if waiting_msg is not None:
+                    try:
+                        await waiting_msg.edit_text(error_text)
+                        edited = True
+                    except Exception:
+                        logger.warning("Could not replace the Gemini preview with the error message")
+                if not edited:
+                    await message.reply(error_text)
     finally:
-        active_gemini_requests.discard(chat_id)
-
+        # Count every request that took the lock, including early returns
+        _prune_chat_state()
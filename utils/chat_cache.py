@@ -0,0 +1,111 @@
+import time
+import logging
+from pyrogram import Client
+from pyrogram.enums import ChatMemberStatus, ChatMembersFilter
+from pyrogram.types import ChatMemberUpdated
+
+logger = logging.getLogger(__name__)
+
+# Chat type and the bot's own status change rarely, so keep them for a while
+# instead of asking Telegram on every admin-gated command.
+CHAT_INFO_TTL = 300
+
+_chat_type_cache = {}  # chat_id -> (ChatType, fetched_at)
+_bot_status_cache = {}  # chat_id -> (ChatMemberStatus, fetched_at)
+
+# Member lookups are kept briefly since the same users tend to run several
+# commands in a row; membership updates below keep entries current.
+MEMBER_TTL = 60
+
+_member_cache = {}  # (chat_id, user_id) -> (ChatMember, fetched_at)
+
+# The full admin list comes back in one request and rarely changes, so it can
+# answer "is this user an admin" for everyone in the chat.
+ADMINS_TTL = 120
+
+_admins_cache = {}  # chat_id -> ({user_id: ChatMember}, fetched_at)
+
+ADMIN_STATUSES = (ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR)
+
+
+def _get_fresh(cache: dict, key, ttl: float):
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    if time.monotonic() - entry[1] < ttl:
+        return entry[0]
+    # Expired entries are dropped so the caches don't keep every chat forever
+    del cache[key]
+    return None
+
+
+async def get_chat_type(client: Client, chat_id: int):
+    """Return the chat's ChatType, fetching it only on a cache miss."""
+    chat_type = _get_fresh(_chat_type_cache, chat_id, CHAT_INFO_TTL)
+    if chat_type is None:
+        chat = await client.get_chat(chat_id)
+        chat_type = chat.type
+        _chat_type_cache[chat_id] = (chat_type, time.monotonic())
+    return chat_type
+
+
+async def get_bot_status(client: Client, chat_id: int):
+    """Return the bot's ChatMemberStatus in the chat, fetching it only on a cache miss."""
+    status = _get_fresh(_bot_status_cache, chat_id, CHAT_INFO_TTL)
+    if status is None:
+        bot_member = await client.get_chat_member(chat_id, "me")
+        status = bot_member.status
+        _bot_status_cache[chat_id] = (status, time.monotonic())
+    return status
+
+
+async def get_chat_member(client: Client, chat_id: int, user_id: int):
+    """Return the user's ChatMember in the chat, fetching it only on a cache miss."""
+    key = (chat_id, user_id)
+    member = _get_fresh(_member_cache, key, MEMBER_TTL)
+    if member is None:
+        member = await client.get_chat_member(chat_id, user_id)
+        _member_cache[key] = (member, time.monotonic())
+    return member
+
+
+async def get_chat_admins(client: Client, chat_id: int):
+    """Return a {user_id: ChatMember} map of the chat's owner and administrators."""
+    admins = _get_fresh(_admins_cache, chat_id, ADMINS_TTL)
+    if admins is None:
+        admins = {}
+        # Basic groups ignore the filter and list everyone, so check the status too
+        async for member in client.get_chat_members(chat_id, filter=ChatMembersFilter.ADMINISTRATORS):
+            if member.user and member.status in ADMIN_STATUSES:
+                admins[member.user.id] = member
+        _admins_cache[chat_id] = (admins, time.monotonic())
+    return admins
+
+
+async def chat_member_updated_handler(client: Client, update: ChatMemberUpdated):
+    """Refresh or invalidate cached entries when someone's membership changes."""
+    member = update.new_chat_member or update.old_chat_member
+    if not member or not member.user:
+        return
+
+    chat_id = update.chat.id
+    key = (chat_id, member.user.id)
+    # Only refresh users we already looked up; other updates aren't worth keeping
+    if update.new_chat_member and _get_fresh(_member_cache, key, MEMBER_TTL) is not None:
+        _member_cache[key] = (update.new_chat_member, time.monotonic())
+    else:
+        _member_cache.pop(key, None)
+
+    cached_admins = _admins_cache.get(chat_id)
+    if cached_admins is not None:
+        admins = cached_admins[0]
+        new_member = update.new_chat_member
+        if new_member and new_member.status in ADMIN_STATUSES:
+            admins[member.user.id] = new_member
+        else:
+            admins.pop(member.user.id, None)
+
+    if member.user.is_self:
+        logger.debug(f"Bot membership changed in chat {chat_id}, dropping cached chat info")
+        _chat_type_cache.pop(chat_id, None)
+        _bot_status_cache.pop(chat_id, None)
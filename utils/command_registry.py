@@ -1,9 +1,10 @@
 from pyrogram import filters, Client
-from pyrogram.handlers import MessageHandler, CallbackQueryHandler
+from pyrogram.handlers import MessageHandler, CallbackQueryHandler, ChatMemberUpdatedHandler
 from config import ENABLE_GEMINI_COMMAND, ENABLE_IMAGINE_COMMAND, ENABLE_MEME_COMMAND
 import handlers as handlers
 from handlers.callback_handlers import button_click_handler
 from handlers.trivia.trivia_commands import register_trivia_handlers
+from utils.chat_cache import chat_member_updated_handler
 
 
 # Register command handlers
@@ -90,3 +91,6 @@ def register_handlers(client: Client):
 
     # Register a callback query handler for button clicks
     client.add_handler(CallbackQueryHandler(button_click_handler))
+
+    # Keep the admin-check caches in sync with membership changes
+    client.add_handler(ChatMemberUpdatedHandler(chat_member_updated_handler))
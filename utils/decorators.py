@@ -1,93 +1,155 @@
+import asyncio
+import operator
+from dataclasses import dataclass
 from functools import wraps
+from typing import Optional
 from pyrogram.types import Message
 from pyrogram.errors import UserAdminInvalid
-from pyrogram.enums import ChatMemberStatus
+from pyrogram.enums import ChatMemberStatus, ChatType
 import logging
 from .helpers import extract_user_and_reason
+from .chat_cache import ADMIN_STATUSES, get_chat_type, get_bot_status, get_chat_member, get_chat_admins
 
 logger = logging.getLogger(__name__)
 
-async def check_admin_permissions(client, chat_id: int, user_id: int):
-    """Check if user has admin permissions with comprehensive debugging."""
+async def check_admin_permissions(
+    client, chat_id: int, user_id: int, *, chat_type=None, bot_status=None, admins=None,
+    check_bot=True, check_admins=True
+):
+    """Check if user has admin permissions with comprehensive debugging.
+
+    Callers that already looked up the chat type, the bot's own status or the
+    administrators map can pass them in; otherwise they are read from the
+    chat info cache. Pass check_bot=False or check_admins=False to skip the
+    bot status check or the administrators list, e.g. when the caller
+    already knows that lookup failed.
+    """
     try:
         # First, check if this is a private chat
-        chat = await client.get_chat(chat_id)
-        if chat.type.name.lower() == "private":
+        if chat_type is None:
+            chat_type = await get_chat_type(client, chat_id)
+        if chat_type == ChatType.PRIVATE:
             logger.info(f"Private chat detected, allowing command for user {user_id}")
             return True
         
-        logger.info(f"Checking admin permissions for user {user_id} in chat {chat_id} ({chat.type})")
+        logger.info(f"Checking admin permissions for user {user_id} in chat {chat_id} ({chat_type})")
         
         # Check bot's own permissions first
-        try:
-            bot_member = await client.get_chat_member(chat_id, "me")
-            logger.info(f"Bot status in chat: {bot_member.status}")
-            if bot_member.status not in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
-                logger.warning("Bot is not an admin in this chat")
-                return False
-        except Exception as e:
-            logger.warning(f"Could not check bot admin status: {e}")
+        if check_bot:
+            try:
+                if bot_status is None:
+                    bot_status = await get_bot_status(client, chat_id)
+                logger.info(f"Bot status in chat: {bot_status}")
+                if bot_status not in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
+                    logger.warning("Bot is not an admin in this chat")
+                    return False
+            except Exception as e:
+                logger.warning(f"Could not check bot admin status: {e}")
         
-        # Try to get user's member status
+        # Serve the check from the cached administrators list
+        if check_admins:
+            try:
+                if admins is None:
+                    admins = await get_chat_admins(client, chat_id)
+                if user_id in admins:
+                    logger.info(f"User {user_id} found in administrators list with status: {admins[user_id].status}")
+                    return True
+                logger.info(f"User {user_id} not found in administrators list")
+                return False
+            except Exception as e:
+                logger.error(f"Error getting administrators list for chat {chat_id}: {e}")
+
+        # Fallback: look up the user's own member status
         try:
-            member = await client.get_chat_member(chat_id, user_id)
+            logger.info("Trying fallback method: checking member status")
+            member = await get_chat_member(client, chat_id, user_id)
             logger.info(f"User {user_id} status: {member.status}")
+            return member.status in ADMIN_STATUSES
 
-            if member.status in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
-                logger.info(f"User {user_id} is admin/owner")
-                return True
-            else:
-                logger.info(f"User {user_id} is not an admin (status: {member.status})")
-                return False
-                
         except UserAdminInvalid as e:
             logger.warning(f"UserAdminInvalid for user {user_id}: {e}")
             return False
-        except Exception as e:
-            logger.error(f"Error getting member info for user {user_id}: {e}")
-            
-            # Fallback: try to get administrators list
-            try:
-                logger.info("Trying fallback method: checking administrators list")
-                admins = await client.get_chat_administrators(chat_id)
-                logger.info(f"Found {len(admins)} administrators")
-                
-                for admin in admins:
-                    if admin.user.id == user_id:
-                        logger.info(f"User {user_id} found in administrators list with status: {admin.status}")
-                        return True
-                
-                logger.info(f"User {user_id} not found in administrators list")
-                return False
-                
-            except Exception as e2:
-                logger.error(f"Fallback admin check also failed: {e2}")
-                return False
-                
+        except Exception as e2:
+            logger.error(f"Fallback admin check also failed: {e2}")
+            return False
+
     except Exception as e:
         logger.error(f"Unexpected error in admin check: {e}")
         return False
 
+@dataclass
+class ChatContext:
+    """Chat details shared by the admin decorators for a single message."""
+    chat_type: ChatType
+    is_private: bool
+    bot_status: Optional[ChatMemberStatus] = None
+    bot_error: Optional[Exception] = None
+    admins: Optional[dict] = None  # {user_id: ChatMember}, None if it couldn't be fetched
+    admins_error: Optional[Exception] = None
+
+async def resolve_context(client, message: Message) -> ChatContext:
+    """Resolve the chat type, bot status and admin list for a message once.
+
+    The result is stored on the message, so stacked decorators such as
+    @require_permission and @protect_admins share a single lookup.
+    """
+    ctx = getattr(message, "_chat_context", None)
+    if ctx is not None:
+        return ctx
+
+    chat_id = message.chat.id
+    # The message already carries the chat type, so no get_chat call is needed
+    chat_type = message.chat.type
+    if chat_type == ChatType.PRIVATE:
+        ctx = ChatContext(chat_type=chat_type, is_private=True)
+    else:
+        bot_status, admins = await asyncio.gather(
+            get_bot_status(client, chat_id),
+            get_chat_admins(client, chat_id),
+            return_exceptions=True,
+        )
+        ctx = ChatContext(chat_type=chat_type, is_private=False)
+        if isinstance(bot_status, Exception):
+            logger.error(f"Could not check bot admin status: {bot_status}")
+            ctx.bot_error = bot_status
+        else:
+            ctx.bot_status = bot_status
+        if isinstance(admins, Exception):
+            logger.error(f"Error getting administrators list for chat {chat_id}: {admins}")
+            ctx.admins_error = admins
+        else:
+            ctx.admins = admins
+
+    message._chat_context = ctx
+    return ctx
+
+async def _ensure_bot_admin(message: Message, ctx: ChatContext):
+    """Reply and return False if the bot can't act as an admin in this chat."""
+    if ctx.bot_error is not None:
+        await message.reply("❌ Unable to verify bot permissions.")
+        return False
+    if ctx.bot_status not in ADMIN_STATUSES:
+        await message.reply("❌ I need administrator permissions to execute admin commands.")
+        return False
+    return True
+
 def admin_only(func):
     """Decorator to restrict command to admins and owners only"""
     @wraps(func)
     async def wrapper(client, message: Message):
         try:
             # First check if bot is admin (except in private chats)
-            chat = await client.get_chat(message.chat.id)
-            if chat.type.name.lower() != "private":
-                try:
-                    bot_member = await client.get_chat_member(message.chat.id, "me")
-                    if bot_member.status not in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
-                        await message.reply("❌ I need administrator permissions to execute admin commands.")
-                        return
-                except Exception as e:
-                    logger.error(f"Could not check bot admin status: {e}")
-                    await message.reply("❌ Unable to verify bot permissions.")
-                    return
+            ctx = await resolve_context(client, message)
+            if not ctx.is_private and not await _ensure_bot_admin(message, ctx):
+                return
             
             # Use the robust admin checking function
-            is_admin = await check_admin_permissions(client, message.chat.id, message.from_user.id)
+            is_admin = await check_admin_permissions(
+                client, message.chat.id, message.from_user.id,
+                chat_type=ctx.chat_type, bot_status=ctx.bot_status, admins=ctx.admins,
+                # resolve_context already tried and logged the admin list lookup
+                check_admins=ctx.admins_error is None
+            )
             if not is_admin:
                 await message.reply("❌ This command is only available to administrators.")
                 return
@@ -110,8 +172,8 @@ def protect_admins(func):
     @wraps(func)
     async def wrapper(client, message: Message):
         # This decorator should only apply in group chats where admin concepts exist
-        chat = await client.get_chat(message.chat.id)
-        if chat.type.name.lower() == "private":
+        ctx = await resolve_context(client, message)
+        if ctx.is_private:
             return await func(client, message)
 
         # Extract the user being targeted by the command
@@ -128,7 +190,12 @@ def protect_admins(func):
             return
 
         # Check if the target user is an admin
-        is_target_admin = await check_admin_permissions(client, message.chat.id, target_user.id)
+        is_target_admin = await check_admin_permissions(
+            client, message.chat.id, target_user.id,
+            chat_type=ctx.chat_type, bot_status=ctx.bot_status, admins=ctx.admins,
+            # resolve_context already tried and logged these lookups
+            check_bot=ctx.bot_error is None, check_admins=ctx.admins_error is None
+        )
         if is_target_admin:
             await message.reply("❌ You cannot use this command on an administrator.")
             return
@@ -140,60 +207,53 @@ def protect_admins(func):
 
 def require_permission(permission: str):
     """Decorator to check if the user has a specific admin permission."""
+    get_permission = operator.attrgetter(permission)
+
+    def has_permission(privileges):
+        try:
+            return bool(get_permission(privileges))
+        except AttributeError:
+            return False
+
     def decorator(func):
         @wraps(func)
         async def wrapper(client, message: Message):
             chat = message.chat
-            if chat.type.name.lower() == "private":
+            ctx = await resolve_context(client, message)
+            if ctx.is_private:
                 return await func(client, message)
 
             # Check bot permissions first
-            try:
-                bot_member = await client.get_chat_member(chat.id, "me")
-                if bot_member.status not in [ChatMemberStatus.OWNER, ChatMemberStatus.ADMINISTRATOR]:
-                    await message.reply("❌ I need administrator permissions to execute admin commands.")
-                    return
-            except Exception as e:
-                logger.error(f"Could not check bot admin status: {e}")
-                await message.reply("❌ Unable to verify bot permissions.")
+            if not await _ensure_bot_admin(message, ctx):
                 return
 
             user_id = message.from_user.id
-            try:
-                member = await client.get_chat_member(chat.id, user_id)
-                
-                if member.status == ChatMemberStatus.OWNER:
-                    return await func(client, message)
-                
-                if member.status == ChatMemberStatus.ADMINISTRATOR:
-                    if member.privileges and getattr(member.privileges, permission, False):
-                        return await func(client, message)
-                    else:
-                        await message.reply(f"❌ You need the `{permission}` permission to use this command.")
-                        return
-                
-                await message.reply("❌ This command is only available to administrators.")
-                
-            except UserAdminInvalid:
-                await message.reply("❌ Unable to verify your permissions.")
-            except Exception as e:
-                logger.error(f"Error checking permission {permission}: {e}")
-                # Fallback: check admin list
+            # The admin list already holds every admin's status and privileges,
+            # so only look the user up individually if it couldn't be fetched
+            if ctx.admins is not None:
+                member = ctx.admins.get(user_id)
+            else:
                 try:
-                    admins = await client.get_chat_administrators(chat.id)
-                    for admin in admins:
-                        if admin.user.id == user_id:
-                            if admin.status == ChatMemberStatus.OWNER:
-                                return await func(client, message)
-                            if admin.privileges and getattr(admin.privileges, permission, False):
-                                return await func(client, message)
-                            else:
-                                await message.reply(f"❌ You need the `{permission}` permission to use this command.")
-                                return
-                    await message.reply("❌ This command is only available to administrators.")
-                except Exception as e2:
-                    logger.error(f"Fallback permission check failed: {e2}")
+                    member = await get_chat_member(client, chat.id, user_id)
+                except UserAdminInvalid:
+                    await message.reply("❌ Unable to verify your permissions.")
+                    return
+                except Exception as e:
+                    logger.error(f"Error checking permission {permission}: {e}")
                     await message.reply("❌ An error occurred while checking permissions.")
-                    
+                    return
+
+            if member is None or member.status not in ADMIN_STATUSES:
+                await message.reply("❌ This command is only available to administrators.")
+                return
+
+            if member.status == ChatMemberStatus.OWNER:
+                return await func(client, message)
+
+            if member.privileges and has_permission(member.privileges):
+                return await func(client, message)
+
+            await message.reply(f"❌ You need the `{permission}` permission to use this command.")
+
         return wrapper
     return decorator
\ No newline at end of file